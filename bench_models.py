@@ -0,0 +1,63 @@
+"""
+Compare the memory and build time of Payload and CompactPayload for a large order.
+
+Usage:
+- python3 bench_models.py --lines 200000
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from models import Payload, CompactPayload
+from utils import create_url, load_product_data
+
+
+def build_payload(lines: int, product_data) -> str:
+    """
+    Build a JSON payload with random SKUs from the product data
+
+    :param lines: The number of order lines
+    :param product_data: The product data to pick SKUs from
+    :return: The JSON payload string
+    """
+    skus = list(product_data.index)
+    order = [{"sku": random.choice(skus), "quantity": random.randint(1, 10)} for _ in range(lines)]
+    return json.dumps({"order": order, "purchase_order_number": "bench"})
+
+
+def measure(payload_cls, json_payload: str, product_data) -> dict:
+    """
+    Measure the peak memory and time to build and group a payload
+
+    :param payload_cls: Payload or CompactPayload
+    :param json_payload: The JSON payload string
+    :param product_data: The product data
+    :return: The measurements
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    payload, _ = payload_cls.from_json(json_payload, product_data, create_url)
+    groups = payload.group_by_size()
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Keep the objects alive until after the measurement
+    del payload, groups
+    return {"seconds": round(elapsed, 3), "retained_mb": round(retained / 2**20, 2), "peak_mb": round(peak / 2**20, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Payload memory benchmark")
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+
+    product_data = load_product_data()
+    json_payload = build_payload(args.lines, product_data)
+    print(f"Order lines: {args.lines}")
+    for payload_cls in (Payload, CompactPayload):
+        print(f"{payload_cls.__name__}: {measure(payload_cls, json_payload, product_data)}")
@@ -0,0 +1,167 @@
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
+
+# Runs a list of DOM operations in the page and reports the result of each one.
+# Waits poll in the page, so a whole step costs a single execute_async_script round-trip.
+BATCH_SCRIPT = """
+const ops = arguments[0];
+const timeoutMs = arguments[1];
+const done = arguments[arguments.length - 1];
+const results = [];
+
+function find(op) {
+    if (op.by === 'xpath') {
+        return document.evaluate(op.selector, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+    }
+    return document.querySelector(op.selector);
+}
+
+function clickable(el) {
+    return el && !el.disabled && el.getClientRects().length > 0;
+}
+
+function fire(el, type) {
+    el.dispatchEvent(new Event(type, {bubbles: true}));
+}
+
+function run(index, deadline) {
+    if (index >= ops.length) {
+        done({ok: true, results: results});
+        return;
+    }
+    const op = ops[index];
+    const el = find(op);
+
+    if (op.op === 'wait') {
+        if (deadline === null) {
+            deadline = Date.now() + timeoutMs;
+        }
+        const ready = op.clickable ? clickable(el) : !!el;
+        if (ready) {
+            results.push(true);
+            run(index + 1, null);
+        } else if (Date.now() > deadline) {
+            done({ok: false, index: index, error: 'timeout', results: results});
+        } else {
+            setTimeout(() => run(index, deadline), 100);
+        }
+        return;
+    }
+    if (op.op === 'exists') {
+        results.push(!!el);
+        run(index + 1, null);
+        return;
+    }
+    if (!el) {
+        done({ok: false, index: index, error: 'not_found', results: results});
+        return;
+    }
+    try {
+        if (op.op === 'set_value') {
+            el.focus();
+            el.value = op.value;
+            fire(el, 'input');
+            fire(el, 'change');
+        } else if (op.op === 'select_text') {
+            const option = Array.from(el.options).find(o => o.text.trim() === op.text);
+            if (!option) {
+                done({ok: false, index: index, error: 'option_not_found', results: results});
+                return;
+            }
+            el.value = option.value;
+            fire(el, 'change');
+        } else if (op.op === 'click') {
+            el.click();
+        }
+    } catch (e) {
+        done({ok: false, index: index, error: String(e), results: results});
+        return;
+    }
+    results.push(true);
+    run(index + 1, null);
+}
+
+run(0, null);
+"""
+
+
+class DomBatch:
+    """
+    Collect the DOM interactions of one step so they run in a single WebDriver call
+
+    Usage:
+        results = DomBatch().wait("#qty").set_value("#qty", "2").click("#Save").execute(driver, 10)
+    """
+
+    def __init__(self):
+        self.ops: List[Dict[str, Any]] = []
+
+    def _add(self, op: str, selector: str, by: str, **fields) -> "DomBatch":
+        self.ops.append({"op": op, "selector": selector, "by": by, **fields})
+        return self
+
+    def wait(self, selector: str, by: str = "css", clickable: bool = False) -> "DomBatch":
+        return self._add("wait", selector, by, clickable=clickable)
+
+    def exists(self, selector: str, by: str = "css") -> "DomBatch":
+        return self._add("exists", selector, by)
+
+    def set_value(self, selector: str, value: str, by: str = "css") -> "DomBatch":
+        return self._add("set_value", selector, by, value=value)
+
+    def select_text(self, selector: str, text: str, by: str = "css") -> "DomBatch":
+        return self._add("select_text", selector, by, text=text)
+
+    def click(self, selector: str, by: str = "css") -> "DomBatch":
+        return self._add("click", selector, by)
+
+    def execute(self, driver, timeout: float) -> List[Any]:
+        """
+        Run the batch in the page
+
+        Each wait gets its own timeout, like a separate WebDriverWait would.
+
+        :param driver: The web driver
+        :param timeout: The timeout for each wait in seconds
+        :return: The result of each operation (exists returns whether the element was found)
+        """
+        response = driver.execute_async_script(BATCH_SCRIPT, self.ops, int(timeout * 1000))
+        if response["ok"]:
+            return response["results"]
+
+        op = self.ops[response["index"]]
+        message = f"Batched {op['op']} failed on {op['selector']}: {response['error']}"
+        if response["error"] == "timeout":
+            raise TimeoutException(message)
+        if response["error"] in ("not_found", "option_not_found"):
+            raise NoSuchElementException(message)
+        raise WebDriverException(message)
+
+
+class CommandCounter:
+    """
+    Count the WebDriver commands sent by a driver
+
+    Every driver and element call goes through driver.execute, so wrapping it
+    on the instance counts each HTTP round-trip to chromedriver.
+    """
+
+    def __init__(self, driver):
+        self.counts = Counter()
+        self._execute = driver.execute
+        driver.execute = self._counting_execute
+
+    def _counting_execute(self, driver_command, params=None):
+        self.counts[driver_command] += 1
+        return self._execute(driver_command, params)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def log_summary(self) -> None:
+        top = ", ".join(f"{command}: {count}" for command, count in self.counts.most_common(10))
+        logging.getLogger(__name__).info(f"[+] WebDriver commands sent: {self.total} ({top})")
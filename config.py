@@ -1 +1,40 @@
-TEST_MODE = True
\ No newline at end of file
+TEST_MODE = True
+
+# Browser performance tracing (see perf_tracing.py)
+PERF_TRACING = False
+PERF_TRACE_SAMPLE_RATE = 0.1  # Fraction of navigations that also get a full Chrome trace
+PERF_TRACE_DIR = "./perf_traces"
+
+# Adaptive timeouts and retries (see latency_policy.py)
+LATENCY_STATS_PATH = "./latency_stats.json"
+RETRY_BUDGET = 10  # Retries allowed per purchase order
+
+# Multi-worker queue (see worker.py)
+QUEUE_DB_PATH = "./work_queue.db"
+LEASE_VISIBILITY_TIMEOUT = 300  # Seconds before a lost lease can be reclaimed
+
+# Use the array-backed CompactPayload for very large orders (see bench_models.py)
+COMPACT_ORDERS = False
+
+# Capture confirmation pages as MHTML and render the PDFs in a process pool (see confirmation_renderer.py)
+DEFERRED_PDF_RENDERING = False
+DEFERRED_PDF_WORKERS = 2
+
+# Idempotent PO submission (see idempotency.py)
+IDEMPOTENCY_DB_PATH = "./idempotency.db"
+IDEMPOTENCY_TTL = 7 * 24 * 3600  # Seconds a completed response is returned for repeat submissions
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = 120  # Seconds without a heartbeat before an unfinished run is considered abandoned
+IDEMPOTENCY_HEARTBEAT_INTERVAL = 30  # Seconds between heartbeats of a running PO
+
+# Check every product URL over HTTP before adding to the cart (see preflight.py)
+PREFLIGHT_VALIDATION = False
+PREFLIGHT_CACHE_PATH = "./preflight_cache.json"
+PREFLIGHT_CACHE_TTL = 24 * 3600
+PREFLIGHT_WORKERS = 8
+
+# Live progress events (see progress.py)
+PROGRESS_EVENTS_JSONL = True  # Write ./logs/{purchase_order_number}-{date}-events.jsonl
+PROGRESS_SSE_PORT = None  # Set a port to serve server-sent events on /events (worker N uses port + N)
+
+# Run each step's DOM interactions in a single execute_async_script call (see command_batch.py)
+BATCH_DOM_COMMANDS = False
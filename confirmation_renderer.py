@@ -0,0 +1,144 @@
+import base64
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.util import Finalize
+from typing import Callable, Dict, Optional
+
+from webdriver_manager.chrome import ChromeDriverManager
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+
+# One headless browser per pool process, reused for every snapshot it renders
+_render_driver = None
+
+
+def _init_render_driver():
+    global _render_driver
+    chrome_options = Options()
+    chrome_options.add_argument("--headless=new")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    _render_driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+    # Pool processes exit without running atexit handlers, so register the cleanup with multiprocessing
+    Finalize(None, _render_driver.quit, exitpriority=10)
+
+
+def render_snapshot(snapshot_path: str, pdf_path: str) -> str:
+    """
+    Render an MHTML snapshot to PDF with the same settings as a live confirmation page
+
+    :param snapshot_path: The path to the MHTML snapshot
+    :param pdf_path: The path to write the PDF to
+    :return: The PDF path
+    """
+    _render_driver.get(f"file://{os.path.abspath(snapshot_path)}")
+    pdf = _render_driver.execute_cdp_cmd("Page.printToPDF", {
+        "printBackground": True,
+        "format": "A4"
+    })
+    with open(pdf_path, 'wb') as f:
+        f.write(base64.b64decode(pdf['data']))
+    os.remove(snapshot_path)
+    return pdf_path
+
+
+class ConfirmationRenderer:
+    """
+    Render captured confirmation snapshots to PDF in a separate process pool
+
+    The automation captures the #OrderMeta page with Page.captureSnapshot and
+    moves on immediately. The pool and its browsers live for the whole process
+    (see get_renderer), so they are shared by every run, and each PDF is
+    reported through a callback once rendered instead of blocking the run.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # pdf path -> render future, until a run claims it with assign()
+        self.pending: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def submit(self, snapshot_path: str, pdf_path: str) -> None:
+        """
+        Queue a snapshot for rendering
+
+        :param snapshot_path: The path to the MHTML snapshot
+        :param pdf_path: The path to write the PDF to
+        """
+        with self.lock:
+            if self.executor is None:
+                # The calling process already runs heartbeat, lease and event threads, which fork can deadlock on
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_render_driver
+                )
+            self.pending[pdf_path] = self.executor.submit(render_snapshot, snapshot_path, pdf_path)
+
+    def assign(self, pdf_path: str, callback: Callable[[str, Optional[str]], None]) -> bool:
+        """
+        Report a pending render to a callback when it finishes
+
+        :param pdf_path: The path the PDF is being rendered to
+        :param callback: Called with the PDF path and the error (None on success)
+        :return: False if no render is pending for this path
+        """
+        with self.lock:
+            future = self.pending.pop(pdf_path, None)
+        if future is None:
+            return False
+
+        def done(future: Future):
+            try:
+                future.result()
+                self.logger.info(f"[+] Rendered deferred confirmation {pdf_path}")
+                error = None
+            except Exception as e:
+                self.logger.error(f"[-] Error rendering deferred confirmation {pdf_path}: {e}")
+                error = str(e)
+            try:
+                callback(pdf_path, error)
+            except Exception as e:
+                self.logger.error(f"[-] Error backfilling deferred confirmation {pdf_path}: {e}")
+
+        future.add_done_callback(done)
+        return True
+
+    def shutdown(self) -> None:
+        """
+        Wait for the queued renders and stop the render processes
+        """
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+_renderer: Optional[ConfirmationRenderer] = None
+
+
+def get_renderer(max_workers: int) -> ConfirmationRenderer:
+    """
+    Get the renderer shared by every run in this process
+
+    :param max_workers: The number of render processes, used when the renderer is first created
+    :return: The renderer
+    """
+    global _renderer
+    if _renderer is None:
+        _renderer = ConfirmationRenderer(max_workers)
+    return _renderer
+
+
+def shutdown_renderer() -> None:
+    """
+    Wait for every deferred PDF in this process to be rendered and backfilled
+    """
+    if _renderer is not None:
+        _renderer.shutdown()
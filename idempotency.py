@@ -0,0 +1,265 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+# begin() outcomes
+STARTED = "started"
+COMPLETED = "completed"
+IN_FLIGHT = "in_flight"
+
+
+def idempotency_key(json_payload: str, test_mode: bool) -> str:
+    """
+    Build the idempotency key for a payload
+
+    Order lines are normalized (SKU case and whitespace, duplicate SKUs summed,
+    line order) so a re-upload of the same PO maps to the same key. Test runs
+    never share a key with real runs.
+
+    :param json_payload: The JSON payload with the order and purchase order number
+    :param test_mode: Whether the run is in TEST_MODE
+    :return: The idempotency key
+    """
+    data = json.loads(json_payload)
+    lines = {}
+    for item in data['order']:
+        sku = item['sku'].strip().upper()
+        lines[sku] = lines.get(sku, 0) + int(item['quantity'])
+    digest = hashlib.sha256(json.dumps(sorted(lines.items())).encode()).hexdigest()
+    return f"{data['purchase_order_number']}:{'test' if test_mode else 'live'}:{digest}"
+
+
+def placed_size_groups(response: Optional[dict]) -> dict:
+    """
+    Get the size groups of a response that were ordered (have a job number)
+
+    :param response: The automation response
+    :return: A dict of size group to its response entry
+    """
+    if not response:
+        return {}
+    return {size: entry for size, entry in response.get("sizes", {}).items() if entry.get("job_number")}
+
+
+def is_complete(response: dict) -> bool:
+    """
+    Check whether every size group of a response was ordered
+
+    :param response: The automation response
+    :return: True if there is nothing left to run
+    """
+    sizes = response.get("sizes", {})
+    return len(placed_size_groups(response)) == len(sizes)
+
+
+class IdempotencyStore:
+    """
+    Persistent cache of automation responses keyed by PO and order lines
+
+    The first caller for a key marks it in flight and runs the automation;
+    later callers either get the stored response or wait for the in-flight run
+    to finish. Only size groups that were ordered are reused: a stored response
+    with failed groups is handed to the next caller so it runs just those.
+    Completed entries expire after the TTL. The owner of an in-flight entry
+    sends heartbeats while it runs; an entry without a heartbeat for the
+    in-flight timeout is considered abandoned and taken over.
+    """
+
+    def __init__(self, db_path: str, ttl: float, in_flight_timeout: float):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.in_flight_timeout = in_flight_timeout
+        self.logger = logging.getLogger(__name__)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS runs (
+                    key TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    response TEXT,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS metrics (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    @staticmethod
+    def _count(conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO metrics (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def begin(self, key: str) -> Tuple[str, Optional[dict]]:
+        """
+        Look up a key and claim it if there is no usable entry
+
+        :param key: The idempotency key
+        :return: STARTED with the partial response of an earlier run (or None) if
+        the caller should run the automation, COMPLETED with the stored response,
+        or IN_FLIGHT if another run is in progress
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT status, response, updated_at FROM runs WHERE key = ?", (key,)).fetchone()
+
+            previous = None
+            if row is not None:
+                status, response, updated_at = row
+                if status == "done" and now - updated_at < self.ttl:
+                    previous = json.loads(response)
+                    if is_complete(previous):
+                        self._count(conn, "hits")
+                        conn.execute("COMMIT")
+                        return COMPLETED, previous
+                    self._count(conn, "partial")
+                elif status == "in_flight" and now - updated_at < self.in_flight_timeout:
+                    self._count(conn, "attached")
+                    conn.execute("COMMIT")
+                    return IN_FLIGHT, None
+                else:
+                    self._count(conn, "expired")
+                    if status == "in_flight" and response:
+                        # An abandoned run keeps the job numbers it stored before it died
+                        previous = json.loads(response)
+                        if is_complete(previous):
+                            conn.execute("UPDATE runs SET status = 'done', updated_at = ? WHERE key = ?", (now, key))
+                            conn.execute("COMMIT")
+                            return COMPLETED, previous
+
+            self._count(conn, "misses")
+            # Keep the placed groups of a partial run so they survive a failed retry
+            conn.execute(
+                "INSERT OR REPLACE INTO runs (key, status, response, updated_at) VALUES (?, 'in_flight', ?, ?)",
+                (key, json.dumps(previous) if previous else None, now)
+            )
+            conn.execute("COMMIT")
+            return STARTED, previous
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, key: str, response: dict) -> None:
+        """
+        Store the response of a finished run
+
+        Runs that ordered no size group are released instead, so the PO can be
+        submitted again.
+
+        :param key: The idempotency key
+        :param response: The automation response
+        """
+        if not placed_size_groups(response):
+            self.release(key)
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET status = 'done', response = ?, updated_at = ? WHERE key = ?",
+                (json.dumps(response), time.time(), key)
+            )
+
+    def update(self, key: str, response: dict) -> None:
+        """
+        Replace the stored response of a run, e.g. when a size group was ordered
+        during the run or a deferred PDF is backfilled after it
+
+        :param key: The idempotency key
+        :param response: The automation response
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET response = ? WHERE key = ? AND status IN ('in_flight', 'done')",
+                (json.dumps(response), key)
+            )
+
+    def release(self, key: str) -> None:
+        """
+        Forget an in-flight run that failed so the next caller can retry it
+
+        A run that started from a partial response falls back to that response.
+
+        :param key: The idempotency key
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE runs SET status = 'done', updated_at = ? "
+                "WHERE key = ? AND status = 'in_flight' AND response IS NOT NULL",
+                (time.time(), key)
+            )
+            conn.execute("DELETE FROM runs WHERE key = ? AND status = 'in_flight'", (key,))
+
+    def heartbeat(self, key: str) -> bool:
+        """
+        Mark an in-flight run as still alive
+
+        :param key: The idempotency key
+        :return: False if the run is no longer in flight
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE runs SET updated_at = ? WHERE key = ? AND status = 'in_flight'",
+                (time.time(), key)
+            )
+            return cursor.rowcount == 1
+
+    def wait(self, key: str, poll_interval: float = 5) -> Optional[dict]:
+        """
+        Wait for an in-flight run to finish, as long as its owner keeps sending heartbeats
+
+        :param key: The idempotency key
+        :param poll_interval: Seconds between checks
+        :return: The response, or None if the run failed, was abandoned or left size groups to retry
+        """
+        while True:
+            with self._connect() as conn:
+                row = conn.execute("SELECT status, response, updated_at FROM runs WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            status, response, updated_at = row
+            if status == "done":
+                response = json.loads(response)
+                return response if is_complete(response) else None
+            if time.time() - updated_at >= self.in_flight_timeout:
+                return None
+            time.sleep(poll_interval)
+
+    def purge_expired(self) -> int:
+        """
+        Delete completed entries older than the TTL
+
+        :return: The number of deleted entries
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM runs WHERE status = 'done' AND updated_at < ?",
+                (time.time() - self.ttl,)
+            )
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        Get the cache metrics
+
+        :return: The hit, miss, attached, expired and partial counts and the hit rate
+        """
+        with self._connect() as conn:
+            stats = {name: 0 for name in ("hits", "misses", "attached", "expired", "partial")}
+            stats.update(dict(conn.execute("SELECT name, value FROM metrics").fetchall()))
+        lookups = stats["hits"] + stats["misses"] + stats["attached"]
+        # Attaching to an in-flight run also saves a browser run
+        stats["hit_rate"] = (stats["hits"] + stats["attached"]) / lookups if lookups else 0.0
+        return stats
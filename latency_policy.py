@@ -0,0 +1,226 @@
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Tuple, Type
+
+from utils import percentile, write_json_atomic
+
+
+class RetryBudgetExhausted(Exception):
+    """Raised when a purchase order has used all of its retries"""
+
+
+class CircuitOpenError(Exception):
+    """Raised when the site is considered degraded and calls are short-circuited"""
+
+
+class LatencyPolicy:
+    """
+    Timeouts, retries and a circuit breaker driven by observed step latency
+
+    Each step (e.g. "add_to_cart.quantity_input") keeps a rolling window of
+    latencies. A timed-out wait is kept as a censored sample at the time it
+    waited, since the real latency was at least that long. Once enough samples
+    exist, the timeout becomes p95 * timeout_multiplier clamped to
+    [min_timeout, max_timeout]; before that, and while the window holds any
+    timed-out samples, the hard-coded default timeout is the floor. Samples are
+    persisted between runs so the policy keeps learning across purchase orders;
+    each save merges this run's samples into the current file, so concurrent
+    workers don't overwrite each other.
+    """
+
+    def __init__(
+            self,
+            stats_path: str,
+            window_size: int = 200,
+            min_samples: int = 20,
+            timeout_multiplier: float = 3.0,
+            min_timeout: float = 3.0,
+            max_timeout: float = 30.0,
+            retry_budget: int = 10,
+            max_attempts: int = 3,
+            backoff_base: float = 1.0,
+            backoff_cap: float = 15.0,
+            breaker_window: int = 10,
+            breaker_failure_ratio: float = 0.5,
+            breaker_cooldown: float = 60.0):
+        self.stats_path = stats_path
+        self.window_size = window_size
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.retry_budget = retry_budget
+        self.retries_used = 0
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_window = breaker_window
+        self.breaker_failure_ratio = breaker_failure_ratio
+        self.breaker_cooldown = breaker_cooldown
+        self.outcomes: Deque[bool] = deque(maxlen=breaker_window)
+        self.opened_at = None
+        self.half_open = False
+        self.logger = logging.getLogger(__name__)
+        # step -> (latency, timed_out) samples
+        self.samples: Dict[str, Deque[Tuple[float, bool]]] = {}
+        # Samples recorded since the last save, merged into the file on save()
+        self.unsaved: Dict[str, List[Tuple[float, bool]]] = {}
+        self.load()
+
+    def _read_samples(self) -> Dict[str, Deque[Tuple[float, bool]]]:
+        if not os.path.exists(self.stats_path):
+            return {}
+        try:
+            with open(self.stats_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to load latency stats from {self.stats_path}: {e}")
+            return {}
+        return {
+            step: deque(
+                [(value, False) if isinstance(value, (int, float)) else tuple(value) for value in values],
+                maxlen=self.window_size
+            )
+            for step, values in stored.items()
+        }
+
+    def load(self) -> None:
+        """
+        Load the latency samples recorded by previous runs
+        """
+        self.samples.update(self._read_samples())
+
+    def save(self) -> None:
+        """
+        Merge the samples recorded since the last save into the stats file
+        """
+        samples = self._read_samples()
+        for step, values in self.unsaved.items():
+            samples.setdefault(step, deque(maxlen=self.window_size)).extend(values)
+        try:
+            write_json_atomic(self.stats_path, {step: list(values) for step, values in samples.items()})
+        except OSError as e:
+            self.logger.warning(f"Failed to save latency stats to {self.stats_path}: {e}")
+            return
+        self.samples = samples
+        self.unsaved = {}
+
+    def record(self, step: str, latency: float, success: bool) -> None:
+        """
+        Record the outcome of a step
+
+        :param step: The step name
+        :param latency: The observed latency in seconds
+        :param success: Whether the step succeeded
+        """
+        self.samples.setdefault(step, deque(maxlen=self.window_size)).append((latency, not success))
+        self.unsaved.setdefault(step, []).append((latency, not success))
+        self.outcomes.append(success)
+
+        if success:
+            if self.half_open:
+                self.logger.info("[+] Circuit breaker closed, site is responding again")
+            self.half_open = False
+        elif self.opened_at is None and (self.half_open or self._is_degraded()):
+            self.logger.warning("[-] Circuit breaker opened, site looks degraded")
+            self.opened_at = time.monotonic()
+            self.half_open = False
+
+    def timeout(self, step: str, default: float) -> float:
+        """
+        Get the timeout to use for a step
+
+        :param step: The step name
+        :param default: The timeout to use until enough samples are observed, and
+        the floor while the step has recent timeouts
+        :return: The timeout in seconds
+        """
+        values = self.samples.get(step)
+        if not values or len(values) < self.min_samples:
+            return default
+        learned = percentile([latency for latency, _ in values], 95) * self.timeout_multiplier
+        floor = self.min_timeout
+        if default is not None and any(timed_out for _, timed_out in values):
+            floor = max(floor, default)
+        return min(max(learned, floor), max(self.max_timeout, floor))
+
+    def check_circuit(self) -> None:
+        """
+        Fail fast while the circuit breaker is open
+
+        After the cooldown a single trial call is let through (half-open); its
+        outcome closes or re-opens the breaker.
+        """
+        if self.opened_at is None:
+            return
+        if time.monotonic() - self.opened_at < self.breaker_cooldown:
+            raise CircuitOpenError("Site is degraded, skipping step until the circuit breaker cools down")
+        # Half-open: the next failure re-opens the breaker with a fresh cooldown
+        self.opened_at = None
+        self.half_open = True
+        self.outcomes.clear()
+
+    def call(self, step: str, func: Callable, *args, retry_on: Tuple[Type[Exception], ...] = (Exception,), **kwargs):
+        """
+        Call a step with retries, jittered backoff and the per-PO retry budget
+
+        :param step: The step name used for logging
+        :param func: The function to call
+        :param retry_on: The exceptions that are worth retrying
+        :return: The return value of func
+        """
+        attempt = 1
+        while True:
+            self.check_circuit()
+            try:
+                return func(*args, **kwargs)
+            except retry_on as e:
+                if attempt >= self.max_attempts:
+                    raise
+                if self.retries_used >= self.retry_budget:
+                    raise RetryBudgetExhausted(f"Retry budget of {self.retry_budget} used up at {step}: {e}") from e
+
+                self.retries_used += 1
+                delay = self.backoff(attempt)
+                self.logger.warning(
+                    f"[-] {step} failed (attempt {attempt}/{self.max_attempts}), retrying in {delay:.1f}s: {e}"
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Full-jitter exponential backoff
+
+        :param attempt: The attempt number that just failed (starting at 1)
+        :return: The delay in seconds
+        """
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** (attempt - 1)))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        Summarize the learned latency percentiles per step
+
+        :return: A dict of step name to p50/p95 latency and the current timeout
+        """
+        summary = {}
+        for step, values in self.samples.items():
+            latencies: List[float] = [latency for latency, _ in values]
+            summary[step] = {
+                "samples": len(latencies),
+                "timeouts": sum(1 for _, timed_out in values if timed_out),
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "timeout": self.timeout(step, None)
+            }
+        return summary
+
+    def _is_degraded(self) -> bool:
+        if len(self.outcomes) < self.breaker_window:
+            return False
+        failures = self.outcomes.count(False)
+        return failures / len(self.outcomes) >= self.breaker_failure_ratio
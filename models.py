@@ -1,5 +1,6 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional, Any
+from array import array
 import json
 import pandas as pd
 
@@ -116,6 +117,165 @@ class Payload:
             size_groups[item_size].add_item(item)
         return list(size_groups.values())
 
+
+class ProductCatalog:
+    """
+    Column lists built once from the product data so order lines can keep a
+    row position instead of copies of the catalog strings
+    """
+    __slots__ = ("columns", "positions")
+
+    COLUMNS = ("catalog_id", "list_id", "item_id", "product_name", "shop_id", "mis_item_id", "size")
+
+    def __init__(self, product_data: pd.DataFrame):
+        self.columns = {name: [str(value) for value in product_data[name].tolist()] for name in self.COLUMNS}
+        self.positions: Dict[str, int] = {}
+        shop_ids = self.columns["shop_id"]
+        for position, sku in enumerate(product_data.index):
+            # Same rule as OrderItem.from_dict: duplicate SKUs use the row with the longest shop_id
+            current = self.positions.get(sku)
+            if current is None or len(shop_ids[position]) > len(shop_ids[current]):
+                self.positions[sku] = position
+
+
+class CompactOrderItem:
+    """
+    Read-only view of one line of a CompactPayload with the same attributes as OrderItem
+    """
+    __slots__ = ("payload", "index")
+
+    def __init__(self, payload: "CompactPayload", index: int):
+        self.payload = payload
+        self.index = index
+
+    def _column(self, name: str) -> str:
+        return self.payload.catalog.columns[name][self.payload.rows[self.index]]
+
+    @property
+    def sku(self) -> str:
+        return self.payload.skus[self.index]
+
+    @property
+    def quantity(self) -> int:
+        return self.payload.quantities[self.index]
+
+    @property
+    def catalog_id(self) -> str:
+        return self._column("catalog_id")
+
+    @property
+    def list_id(self) -> str:
+        return self._column("list_id")
+
+    @property
+    def item_id(self) -> str:
+        return self._column("item_id")
+
+    @property
+    def product_name(self) -> str:
+        return self._column("product_name")
+
+    @property
+    def shop_id(self) -> str:
+        return self._column("shop_id")
+
+    @property
+    def mis_itm_is(self) -> str:
+        return self._column("mis_item_id")
+
+    @property
+    def size(self) -> str:
+        return self._column("size")
+
+    @property
+    def url(self) -> str:
+        # Generated on access so the formatted URL is never stored per line
+        return self.payload.create_url_func(self.catalog_id, self.list_id, self.item_id)
+
+    def __repr__(self):
+        return f"CompactOrderItem(sku={self.sku!r}, quantity={self.quantity!r}, size={self.size!r})"
+
+
+class CompactOrderGroup:
+    """
+    Index-based view of the lines of a CompactPayload that share a size
+    """
+    __slots__ = ("size_group", "payload", "indices")
+
+    def __init__(self, size_group: str, payload: "CompactPayload"):
+        self.size_group = size_group
+        self.payload = payload
+        self.indices = array("i")
+
+    @property
+    def items(self) -> List[CompactOrderItem]:
+        return [CompactOrderItem(self.payload, index) for index in self.indices]
+
+    def __len__(self):
+        return len(self.indices)
+
+
+class CompactPayload:
+    """
+    Array-backed alternative to Payload for very large orders
+
+    Each line stores its SKU, its quantity and the position of its catalog
+    row; every other field is read from the shared ProductCatalog.
+    """
+    __slots__ = ("catalog", "create_url_func", "skus", "quantities", "rows")
+
+    def __init__(self, catalog: ProductCatalog, create_url_func):
+        self.catalog = catalog
+        self.create_url_func = create_url_func
+        self.skus: List[str] = []
+        self.quantities = array("i")
+        self.rows = array("i")
+
+    @property
+    def order(self) -> List[CompactOrderItem]:
+        return [CompactOrderItem(self, index) for index in range(len(self.skus))]
+
+    @classmethod
+    def from_json(cls, json_data: str, product_data: pd.DataFrame, create_url_func):
+        """
+        Create the compact payload object from the pd.Dataframe and the json_data
+
+        :param json_data: The json data to create the payload object from
+        :param product_data: The product data to create the payload object from
+        :param create_url_func: The function to create the url for
+        the order item
+        :return: The payload object and the errors for SKUs not in the product data
+        """
+        data = json.loads(json_data)
+        payload = cls(ProductCatalog(product_data), create_url_func)
+        positions = payload.catalog.positions
+        errors = {}
+        for item in data['order']:
+            position = positions.get(item['sku'])
+            if position is None:
+                errors[item['sku']] = "SKU not found in product data"
+                continue
+            payload.skus.append(item['sku'])
+            payload.quantities.append(item['quantity'])
+            payload.rows.append(position)
+
+        return payload, errors
+
+    def group_by_size(self) -> List[CompactOrderGroup]:
+        """
+        Group the order lines by size
+
+        :return: The list of order group views
+        """
+        sizes = self.catalog.columns["size"]
+        size_groups: Dict[str, CompactOrderGroup] = {}
+        for index, row in enumerate(self.rows):
+            item_size = sizes[row]
+            if item_size not in size_groups:
+                size_groups[item_size] = CompactOrderGroup(item_size, self)
+            size_groups[item_size].indices.append(index)
+        return list(size_groups.values())
+
 # Example usage:
 if __name__ == "__main__":
     json_payload = '''
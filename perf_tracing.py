@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from utils import percentile
+
+# Chrome trace categories collected for sampled navigations
+TRACE_CATEGORIES = "devtools.timeline,blink.user_timing,loading,v8.execute"
+
+# Navigation Timing values are reported as milliseconds relative to navigation start
+NAVIGATION_TIMING_SCRIPT = """
+const entry = performance.getEntriesByType('navigation')[0];
+if (!entry) { return null; }
+return {
+    ttfb: entry.responseStart - entry.requestStart,
+    response: entry.responseEnd - entry.responseStart,
+    dom_interactive: entry.domInteractive,
+    dom_content_loaded: entry.domContentLoadedEventEnd,
+    load_event_end: entry.loadEventEnd,
+    duration: entry.duration,
+    transfer_size: entry.transferSize
+};
+"""
+
+# Performance.getMetrics values worth keeping (durations are in seconds)
+CDP_METRICS = (
+    "ScriptDuration",
+    "LayoutDuration",
+    "RecalcStyleDuration",
+    "TaskDuration",
+    "JSHeapUsedSize",
+    "Nodes",
+)
+
+
+class PerformanceTracer:
+    """
+    Collect browser-level performance data for each navigation
+
+    Every traced navigation records the wall clock time of driver.get, the
+    Navigation Timing entry of the loaded page and the CDP Performance.getMetrics
+    deltas. A sampled fraction of navigations also writes a full Chrome trace
+    built from the chromedriver performance log.
+    """
+
+    def __init__(self, purchase_order_number: str, output_dir: str, sample_rate: float):
+        self.sample_rate = sample_rate
+        self.records: List[Dict] = []
+        self.logger = logging.getLogger(__name__)
+        self.run_dir = os.path.join(
+            output_dir,
+            f"{purchase_order_number}-{datetime.now().strftime('%m-%d-%Y-%H%M%S')}"
+        )
+        os.makedirs(self.run_dir, exist_ok=True)
+
+    @staticmethod
+    def configure_options(chrome_options) -> None:
+        """
+        Enable the chromedriver performance log so trace events can be collected
+
+        :param chrome_options: The Chrome options used to start the driver
+        """
+        chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        chrome_options.add_experimental_option("perfLoggingPrefs", {
+            "enableNetwork": False,
+            "enablePage": False,
+            "traceCategories": TRACE_CATEGORIES
+        })
+
+    def attach(self, driver) -> None:
+        """
+        Enable the CDP Performance domain on the driver
+
+        :param driver: The web driver to trace
+        """
+        driver.execute_cdp_cmd("Performance.enable", {"timeDomain": "timeTicks"})
+        # Discard the events collected while starting the browser
+        self._drain_performance_log(driver)
+
+    def navigate(self, driver, url: str, page_type: str, step: str) -> None:
+        """
+        Navigate to a URL and record its performance data
+
+        :param driver: The web driver to navigate with
+        :param url: The URL to navigate to
+        :param page_type: The page type used to group the summary (e.g. product, cart)
+        :param step: The automation step that triggered the navigation
+        """
+        metrics_before = self._get_metrics(driver)
+        # Discard events from the previous step's sleeps, clicks and waits
+        self._drain_performance_log(driver)
+        start = time.perf_counter()
+        driver.get(url)
+        elapsed = time.perf_counter() - start
+
+        record = {
+            "page_type": page_type,
+            "step": step,
+            "url": url,
+            "timestamp": datetime.now().isoformat(),
+            "get_duration_ms": elapsed * 1000,
+            "navigation_timing": self._get_navigation_timing(driver),
+            "metrics": self._diff_metrics(metrics_before, self._get_metrics(driver)),
+            "trace_file": None
+        }
+
+        trace_events = self._drain_performance_log(driver)
+        if trace_events and random.random() < self.sample_rate:
+            record["trace_file"] = self._write_trace(trace_events, page_type, len(self.records))
+
+        self.records.append(record)
+
+    def write_summary(self) -> Optional[str]:
+        """
+        Write the recorded navigations and a p50/p95 summary per page type
+
+        :return: The path to the summary file, or None if nothing was recorded
+        """
+        if not self.records:
+            return None
+
+        with open(os.path.join(self.run_dir, "navigations.jsonl"), "w") as f:
+            for record in self.records:
+                f.write(json.dumps(record) + "\n")
+
+        summary = {}
+        for page_type in sorted({record["page_type"] for record in self.records}):
+            records = [record for record in self.records if record["page_type"] == page_type]
+            samples = {"get_duration_ms": [record["get_duration_ms"] for record in records]}
+            for record in records:
+                for source in ("navigation_timing", "metrics"):
+                    for name, value in (record[source] or {}).items():
+                        if isinstance(value, (int, float)):
+                            samples.setdefault(name, []).append(value)
+
+            summary[page_type] = {
+                "count": len(records),
+                **{
+                    name: {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+                    for name, values in samples.items()
+                }
+            }
+
+        summary_path = os.path.join(self.run_dir, "summary.json")
+        with open(summary_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+        self.logger.info(f"[+] Performance summary written to {summary_path}")
+        return summary_path
+
+    def _get_metrics(self, driver) -> Dict[str, float]:
+        try:
+            metrics = driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]
+            return {metric["name"]: metric["value"] for metric in metrics if metric["name"] in CDP_METRICS}
+        except Exception as e:
+            self.logger.warning(f"Failed to collect CDP performance metrics: {e}")
+            return {}
+
+    @staticmethod
+    def _diff_metrics(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, float]:
+        # Durations are cumulative for the session, sizes and counts are absolute
+        return {
+            name: value - before.get(name, 0) if name.endswith("Duration") else value
+            for name, value in after.items()
+        }
+
+    def _get_navigation_timing(self, driver) -> Optional[Dict[str, float]]:
+        try:
+            return driver.execute_script(NAVIGATION_TIMING_SCRIPT)
+        except Exception as e:
+            self.logger.warning(f"Failed to collect navigation timing: {e}")
+            return None
+
+    def _drain_performance_log(self, driver) -> List[Dict]:
+        try:
+            entries = driver.get_log("performance")
+        except Exception as e:
+            self.logger.warning(f"Failed to read performance log: {e}")
+            return []
+
+        events = []
+        for entry in entries:
+            message = json.loads(entry["message"])["message"]
+            if message.get("method") == "Tracing.dataCollected":
+                events.append(message["params"])
+        return events
+
+    def _write_trace(self, events: List[Dict], page_type: str, index: int) -> str:
+        trace_path = os.path.join(self.run_dir, f"trace-{index:04d}-{page_type}.json")
+        with open(trace_path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+        return trace_path
@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils import write_json_atomic
+
+# Element the product form must contain for add_to_cart to work
+PRODUCT_FORM_MARKER = 'id="qty_DocMartPrompt2"'
+
+# Statuses that positively identify a product page that no longer exists
+MISSING_PAGE_STATUSES = (404, 410)
+
+
+class PreflightValidator:
+    """
+    Check product URLs over plain HTTP before the browser adds anything to the cart
+
+    URLs are fetched concurrently through one pooled requests.Session that
+    carries the cookies of the logged in browser. Definitive results are
+    cached on disk for the TTL: the product page itself was served with or
+    without the form, or it is gone (404 or 410). Anything else (network and
+    server errors, redirects such as an expired session bouncing to SignIn)
+    neither rejects the line nor gets cached.
+    """
+
+    def __init__(self, cache_path: str, ttl: float, max_workers: int, timeout: float = 15):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        self.cache: Dict[str, dict] = self._load_cache()
+
+    def _load_cache(self) -> Dict[str, dict]:
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Failed to load preflight cache from {self.cache_path}: {e}")
+            return {}
+
+    def _save_cache(self) -> None:
+        # Merge with the entries other workers saved since we loaded, keeping the newest check
+        merged = self._load_cache()
+        for url, entry in self.cache.items():
+            if url not in merged or merged[url]["checked_at"] < entry["checked_at"]:
+                merged[url] = entry
+        now = time.time()
+        fresh = {url: entry for url, entry in merged.items() if now - entry["checked_at"] < self.ttl}
+        try:
+            write_json_atomic(self.cache_path, fresh)
+        except OSError as e:
+            self.logger.warning(f"Failed to save preflight cache to {self.cache_path}: {e}")
+
+    def _build_session(self, cookies: Iterable[dict], user_agent: Optional[str]) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        for cookie in cookies:
+            session.cookies.set(cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"))
+        if user_agent:
+            session.headers["User-Agent"] = user_agent
+        return session
+
+    def _check(self, session: requests.Session, url: str) -> Tuple[Optional[str], bool]:
+        """
+        Check a single URL
+
+        :return: The error (None if the URL is valid) and whether the result is definitive
+        """
+        try:
+            response = session.get(url, timeout=self.timeout)
+        except requests.RequestException as e:
+            return f"Preflight request failed: {e}", False
+
+        if response.status_code in MISSING_PAGE_STATUSES:
+            return f"Product page returned HTTP {response.status_code}", True
+        if response.status_code != 200:
+            return f"Preflight request failed with HTTP {response.status_code}", False
+        if response.history or "signin" in response.url.lower():
+            # We did not get the product page itself, e.g. the session expired
+            return f"Preflight request was redirected to {response.url}", False
+        if PRODUCT_FORM_MARKER not in response.text:
+            return "Product page has no order form (stale catalog ids or discontinued item)", True
+        return None, True
+
+    def validate(self, urls: Iterable[str], cookies: Iterable[dict], user_agent: Optional[str] = None) -> Dict[str, str]:
+        """
+        Validate product URLs
+
+        :param urls: The URLs to validate (duplicates are checked once)
+        :param cookies: The browser cookies of the logged in session
+        :param user_agent: The browser user agent
+        :return: A dict of URL to error for every URL that failed validation
+        """
+        now = time.time()
+        errors: Dict[str, str] = {}
+        to_check = []
+        unique_urls = set(urls)
+        for url in unique_urls:
+            entry = self.cache.get(url)
+            if entry and now - entry["checked_at"] < self.ttl:
+                if entry["error"]:
+                    errors[url] = entry["error"]
+            else:
+                to_check.append(url)
+
+        self.logger.info(f"[+] Preflight: {len(to_check)} URLs to check, {len(unique_urls) - len(to_check)} cached")
+        if to_check:
+            session = self._build_session(cookies, user_agent)
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                results = executor.map(lambda url: self._check(session, url), to_check)
+                for url, (error, definitive) in zip(to_check, results):
+                    if not definitive:
+                        # Let the browser try lines we could not check rather than dropping them
+                        self.logger.warning(f"[-] {error}: {url}")
+                        continue
+                    if error:
+                        errors[url] = error
+                    self.cache[url] = {"error": error, "checked_at": now}
+            session.close()
+            self._save_cache()
+
+        return errors
@@ -0,0 +1,185 @@
+import itertools
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class Subscription:
+    """
+    Bounded buffer of events for one consumer
+
+    When the consumer falls behind, the oldest events are dropped so the
+    publisher never waits on it.
+    """
+
+    def __init__(self, max_events: int):
+        self.events = deque(maxlen=max_events)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, event: Dict) -> None:
+        with self.condition:
+            if len(self.events) == self.events.maxlen:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Wait for the next event
+
+        :param timeout: Seconds to wait before giving up
+        :return: The next event, or None on timeout
+        """
+        with self.condition:
+            if not self.events:
+                self.condition.wait(timeout)
+            return self.events.popleft() if self.events else None
+
+
+class ProgressBus:
+    """
+    In-process pub/sub bus for automation progress events
+    """
+
+    def __init__(self, max_events: int = 1000):
+        self.max_events = max_events
+        self.subscriptions: List[Subscription] = []
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_events)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self.lock:
+            if subscription in self.subscriptions:
+                self.subscriptions.remove(subscription)
+
+    def publish(self, event_type: str, purchase_order_number: str, **data) -> None:
+        """
+        Publish an event to every subscriber without blocking
+
+        :param event_type: The event type (e.g. item_added)
+        :param purchase_order_number: The purchase order the event belongs to
+        :param data: The event fields
+        """
+        event = {
+            "id": next(self.sequence),
+            "type": event_type,
+            "purchase_order_number": purchase_order_number,
+            "timestamp": datetime.now().isoformat(),
+            **data
+        }
+        with self.lock:
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+# Bus shared by every automation in the process
+progress_bus = ProgressBus()
+
+
+class JsonlSink:
+    """
+    Append the events of one purchase order to a JSONL file from a background thread
+    """
+
+    def __init__(self, bus: ProgressBus, path: str, purchase_order_number: str):
+        self.bus = bus
+        self.path = path
+        self.purchase_order_number = purchase_order_number
+        self.subscription = bus.subscribe()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._write, daemon=True)
+        self.thread.start()
+
+    def _write(self) -> None:
+        with open(self.path, "a") as f:
+            while not (self.stopped.is_set() and not self.subscription.events):
+                event = self.subscription.get(timeout=1)
+                if event and event["purchase_order_number"] == self.purchase_order_number:
+                    f.write(json.dumps(event) + "\n")
+                    f.flush()
+
+    def stop(self) -> None:
+        """
+        Write the remaining events and detach from the bus
+        """
+        self.stopped.set()
+        self.thread.join()
+        self.bus.unsubscribe(self.subscription)
+        if self.subscription.dropped:
+            logging.getLogger(__name__).warning(f"[-] {self.subscription.dropped} progress events dropped for {self.path}")
+
+
+class _EventStreamHandler(BaseHTTPRequestHandler):
+    bus: ProgressBus = progress_bus
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/events":
+            self.send_error(404)
+            return
+        purchase_order_number = parse_qs(url.query).get("purchase_order_number", [None])[0]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "keep-alive")
+        self.end_headers()
+
+        subscription = self.bus.subscribe()
+        try:
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    self.wfile.write(b": keepalive\n\n")
+                elif purchase_order_number in (None, event["purchase_order_number"]):
+                    self.wfile.write(f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.bus.unsubscribe(subscription)
+
+    def log_message(self, format, *args):
+        logging.getLogger(__name__).debug(format % args)
+
+
+_sse_server: Optional[ThreadingHTTPServer] = None
+
+
+def start_sse_server(port: int) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve the progress bus as server-sent events on /events (started once per process)
+
+    The bus only holds the events of this process, so every process that runs
+    automations needs its own port. Clients can filter with
+    /events?purchase_order_number=...
+
+    :param port: The port to listen on (localhost only)
+    :return: The running server, or None if the port could not be bound
+    """
+    global _sse_server
+    if _sse_server is None:
+        logger = logging.getLogger(__name__)
+        try:
+            _sse_server = ThreadingHTTPServer(("127.0.0.1", port), _EventStreamHandler)
+        except OSError as e:
+            # Progress streaming is optional, never fail a run over it
+            logger.warning(f"[-] Failed to serve progress events on port {port}: {e}")
+            return None
+        _sse_server.daemon_threads = True
+        threading.Thread(target=_sse_server.serve_forever, daemon=True).start()
+        logger.info(f"[+] Progress events served on http://127.0.0.1:{port}/events")
+    return _sse_server
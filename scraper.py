@@ -17,7 +17,7 @@ Usage:
 
 import os
 from webautomation import WebAutomation
-from models import Payload, OrderGroup
+from models import Payload, CompactPayload, OrderGroup
 from utils import create_url, load_product_data
 from typing import List
 from dotenv import load_dotenv
@@ -26,7 +26,13 @@ import logging
 import traceback
 import json
 import csv
-from config import TEST_MODE
+import threading
+from config import TEST_MODE, COMPACT_ORDERS
+from config import IDEMPOTENCY_DB_PATH, IDEMPOTENCY_TTL, IDEMPOTENCY_IN_FLIGHT_TIMEOUT, IDEMPOTENCY_HEARTBEAT_INTERVAL
+from config import PROGRESS_SSE_PORT
+from idempotency import IdempotencyStore, idempotency_key, placed_size_groups, COMPLETED, IN_FLIGHT
+from progress import start_sse_server
+from confirmation_renderer import shutdown_renderer
 # Setup logging and load environment variables
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -60,7 +66,21 @@ def print_banner():
     print(pyfiglet.figlet_format("MoellerMatic"))
 
 
-def main(json_payload: str):
+def run_automation(json_payload: str, username: str = None, password: str = None, abort_event=None, on_pdf_stored=None,
+                   ordered_size_groups: dict = None, on_group_ordered=None):
+    """
+    Run the automation for a JSON payload
+
+    :param json_payload: The JSON payload with the order and purchase order number
+    :param username: The robot account to use (defaults to USERNAME from the environment)
+    :param password: The robot account password (defaults to PASSWORD from the environment)
+    :param abort_event: Set to stop the run before the next cart change or order placement
+    :param on_pdf_stored: Called with the automation response whenever a deferred PDF is backfilled
+    :param ordered_size_groups: Size groups already ordered by an earlier run, which are not run again
+    :param on_group_ordered: Called with the automation response as soon as a size group gets a job number
+    :return: The automation response
+    """
+    automation_response = {}
     try:
         # Print automation name
         print_banner()
@@ -69,7 +89,8 @@ def main(json_payload: str):
         product_data = load_product_data()
 
         # Create Payload object from JSON
-        payload, errors = Payload.from_json(json_payload, product_data, create_url)
+        payload_cls = CompactPayload if COMPACT_ORDERS else Payload
+        payload, errors = payload_cls.from_json(json_payload, product_data, create_url)
 
         # If there are errors, print SKUs and their quantities
         if errors:
@@ -94,13 +115,26 @@ def main(json_payload: str):
         }
         populate_automation_response(automation_response, order_groups)
 
+        # Reuse the size groups an earlier submission of this PO already ordered
+        if ordered_size_groups:
+            automation_response["sizes"].update(
+                {size: entry for size, entry in ordered_size_groups.items() if size in automation_response["sizes"]}
+            )
+            order_groups = [order_group for order_group in order_groups if order_group.size_group not in ordered_size_groups]
+            print(f"Skipping size groups already ordered: {', '.join(ordered_size_groups)}")
+            if not order_groups:
+                return automation_response
+
         # Set up WebAutomation with environment variables
         BASE_URL = "https://www.myorderdesk.com/SignIn/"
-        USERNAME = os.getenv("USERNAME")
-        PASSWORD = os.getenv("PASSWORD")
+        USERNAME = username or os.getenv("USERNAME")
+        PASSWORD = password or os.getenv("PASSWORD")
 
         purchase_order_number = json.loads(json_payload)['purchase_order_number']
-        automation = WebAutomation(BASE_URL, USERNAME, PASSWORD, automation_response, purchase_order_number)
+        automation = WebAutomation(
+            BASE_URL, USERNAME, PASSWORD, automation_response, purchase_order_number, abort_event, on_pdf_stored,
+            on_group_ordered
+        )
         # Run the automation
         automation_response = automation.run(order_groups)
 
@@ -115,6 +149,91 @@ def main(json_payload: str):
             "errors": automation_response.get("errors", {})
         }
 
+
+def send_heartbeats(store: IdempotencyStore, key: str, stop: threading.Event) -> None:
+    """
+    Keep the in-flight idempotency entry alive until the run finishes
+
+    :param store: The idempotency store
+    :param key: The idempotency key of the run
+    :param stop: Set when the run has finished
+    """
+    while not stop.wait(IDEMPOTENCY_HEARTBEAT_INTERVAL):
+        try:
+            if not store.heartbeat(key):
+                logger.error(f"[-] Idempotency entry {key} is no longer in flight, another run may take it over")
+                return
+        except Exception as e:
+            logger.error(f"[-] Failed to send idempotency heartbeat for {key}: {e}")
+
+
+def main(json_payload: str, username: str = None, password: str = None, abort_event=None, on_pdf_stored=None):
+    """
+    Run the automation for a JSON payload unless the same PO was already submitted
+
+    A PO with the same order lines returns the stored automation response while
+    its cache entry is fresh, or waits for the run already in progress. Size
+    groups that failed in the stored response are run again.
+
+    :param json_payload: The JSON payload with the order and purchase order number
+    :param username: The robot account to use (defaults to USERNAME from the environment)
+    :param password: The robot account password (defaults to PASSWORD from the environment)
+    :param abort_event: Set to stop the run before the next cart change or order placement
+    :param on_pdf_stored: Called with the automation response whenever a deferred PDF is backfilled
+    :return: The automation response
+    """
+    store = IdempotencyStore(IDEMPOTENCY_DB_PATH, IDEMPOTENCY_TTL, IDEMPOTENCY_IN_FLIGHT_TIMEOUT)
+    store.purge_expired()
+    key = idempotency_key(json_payload, TEST_MODE)
+    status, automation_response = store.begin(key)
+    logger.info(f"[+] Idempotency lookup for {key}: {status}, stats: {store.stats()}")
+
+    if status == COMPLETED:
+        print("This purchase order was already processed, returning the stored response")
+        return automation_response
+
+    if status == IN_FLIGHT:
+        print("This purchase order is already being processed, waiting for it to finish")
+        automation_response = store.wait(key)
+        if automation_response is not None:
+            return automation_response
+        # The other run failed or was abandoned; run it ourselves
+        status, automation_response = store.begin(key)
+        if status == COMPLETED:
+            return automation_response
+        if status == IN_FLIGHT:
+            return {"status_code": 409, "critical_error": "Purchase order is already being processed", "sizes": {}, "errors": {}}
+
+    stop_heartbeat = threading.Event()
+    heartbeat = threading.Thread(target=send_heartbeats, args=(store, key, stop_heartbeat), daemon=True)
+    heartbeat.start()
+    try:
+        def pdf_stored(automation_response: dict):
+            # Deferred PDFs arrive after the run returned; keep the stored response current
+            store.update(key, automation_response)
+            if on_pdf_stored:
+                on_pdf_stored(automation_response)
+
+        def group_ordered(automation_response: dict):
+            # Store the job number right away so a crash later in the run can't re-order this group
+            store.update(key, automation_response)
+
+        automation_response = run_automation(
+            json_payload, username, password, abort_event, pdf_stored, placed_size_groups(automation_response),
+            group_ordered
+        )
+    except BaseException:
+        store.release(key)
+        raise
+    finally:
+        stop_heartbeat.set()
+        heartbeat.join()
+
+    # Only size groups with a job number are reused; runs that ordered nothing are released
+    store.complete(key, automation_response)
+    return automation_response
+
+
 def csv_to_json_payload(csv_path: str) -> str:
     """
     Convert a CSV file to a JSON payload string.
@@ -163,7 +282,11 @@ if __name__ == "__main__":
     else:
         raise SystemExit("End Test")
 
+    if PROGRESS_SSE_PORT:
+        start_sse_server(PROGRESS_SSE_PORT)
     return_response = main(json_payload)
+    # Wait for deferred confirmation PDFs so they are included in the printed response
+    shutdown_renderer()
     if TEST_MODE:
         print("============ TEST MODE =============")
     print(json.dumps(return_response, indent=2))
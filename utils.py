@@ -1,6 +1,8 @@
 import os
 import csv
-from typing import Dict, Any, List
+import json
+import tempfile
+from typing import Dict, Any, List, Optional
 import pandas as pd
 
 
@@ -46,3 +48,40 @@ def create_url(catalog_id: str, list_id: str, item_id: str) -> str:
     """
     base_url = "https://www.myorderdesk.com/FormV2.asp"
     return f"{base_url}?Provider_ID=1325030&OrderFormID=534080&CatalogID={catalog_id}&INVSYN={list_id}|{item_id}"
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """
+    Compute a percentile using linear interpolation between the closest ranks
+
+    :param values: The values to compute the percentile from
+    :param pct: The percentile to compute (0-100)
+    :return: The percentile value, or None if there are no values
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * (pct / 100)
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def write_json_atomic(path: str, data: Any) -> None:
+    """
+    Write JSON to a temporary file and move it over the target
+
+    Readers in other processes see either the old or the new file, never a
+    partially written one.
+
+    :param path: The path of the JSON file
+    :param data: The data to serialize
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
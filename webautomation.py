@@ -2,32 +2,69 @@ import logging
 import time
 import os
 import base64
+import functools
+import threading
 from models import OrderGroup, OrderItem
 from typing import List
 from datetime import datetime, timedelta
-from config import TEST_MODE
+from config import TEST_MODE, PERF_TRACING, PERF_TRACE_SAMPLE_RATE, PERF_TRACE_DIR, LATENCY_STATS_PATH, RETRY_BUDGET
+from config import DEFERRED_PDF_RENDERING, DEFERRED_PDF_WORKERS
+from config import PREFLIGHT_VALIDATION, PREFLIGHT_CACHE_PATH, PREFLIGHT_CACHE_TTL, PREFLIGHT_WORKERS
+from config import PROGRESS_EVENTS_JSONL, BATCH_DOM_COMMANDS
+from perf_tracing import PerformanceTracer
+from latency_policy import LatencyPolicy
+from confirmation_renderer import get_renderer
+from preflight import PreflightValidator
+from progress import progress_bus, JsonlSink
+from command_batch import DomBatch, CommandCounter
 
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import WebDriverException, TimeoutException, NoSuchElementException
+from selenium.common.exceptions import WebDriverException, TimeoutException, NoSuchElementException, StaleElementReferenceException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.support.ui import Select
 
+class RunAborted(Exception):
+    """Raised when the run must stop because another worker may now own the PO or account"""
+
+
+ACKNOWLEDGE_TEXT = "to the terms shown in the PX catalog welcome page and the policies linked at the bottom of the site."
+
+# Failures worth retrying; checkout is never retried so an order can't be placed twice
+RETRYABLE_EXCEPTIONS = (TimeoutException, NoSuchElementException, StaleElementReferenceException)
+
 
 class WebAutomation:
-    def __init__(self, base_url, username, password, automation_response, purchase_order_number):
+    def __init__(self, base_url, username, password, automation_response, purchase_order_number, abort_event=None, on_pdf_stored=None,
+                 on_group_ordered=None):
         self.base_url = base_url
         self.username = username
         self.password = password
         self.automation_response = automation_response
         self.purchase_order_number = purchase_order_number
         self.driver = None
+        # Set by a queue worker when it loses its job or account lease
+        self.abort_event = abort_event
+        # Called with the automation response whenever a deferred PDF is backfilled
+        self.on_pdf_stored = on_pdf_stored
+        # Called with the automation response as soon as a size group gets a job number
+        self.on_group_ordered = on_group_ordered
         self.logger = logging.getLogger(__name__)
         self.setup_logging(purchase_order_number)
+        self.tracer = PerformanceTracer(purchase_order_number, PERF_TRACE_DIR, PERF_TRACE_SAMPLE_RATE) if PERF_TRACING else None
+        self.renderer = get_renderer(DEFERRED_PDF_WORKERS) if DEFERRED_PDF_RENDERING else None
+        self.preflight_validator = PreflightValidator(PREFLIGHT_CACHE_PATH, PREFLIGHT_CACHE_TTL, PREFLIGHT_WORKERS) if PREFLIGHT_VALIDATION else None
+        self.policy = LatencyPolicy(LATENCY_STATS_PATH, retry_budget=RETRY_BUDGET)
+        self.event_sink = None
+        # The JSONL sink stays open until run() is done and every deferred PDF has been backfilled
+        self.pending_pdfs = 0
+        self.run_done = False
+        self.sink_lock = threading.Lock()
+        self.command_counter = None
 
     def setup_logging(self, purchase_order_number):
         """
@@ -68,20 +105,100 @@ class WebAutomation:
             chrome_options.add_argument("--kiosk-printing")
             chrome_options.add_argument("--no-sandbox")
             chrome_options.add_argument("--disable-dev-shm-usage")
+            if self.tracer:
+                PerformanceTracer.configure_options(chrome_options)
 
             self.driver = webdriver.Chrome(service=service, options=chrome_options)
+            self.command_counter = CommandCounter(self.driver)
+            if BATCH_DOM_COMMANDS:
+                # Batched steps wait inside the page, so allow several waits per script
+                self.driver.set_script_timeout(120)
+            if self.tracer:
+                self.tracer.attach(self.driver)
             self.driver.get(self.base_url)
             self.logger.info("[+] WebDriver initialized and navigated to base URL.")
         except WebDriverException as e:
             self.logger.error(f"Failed to initialize WebDriver: {e}")
             raise
 
+    def emit(self, event_type: str, **data):
+        """
+        Publish a progress event for this purchase order
+
+        :param event_type: The event type (e.g. item_added)
+        :param data: The event fields
+        """
+        progress_bus.publish(event_type, self.purchase_order_number, **data)
+
+    def check_abort(self):
+        """
+        Stop before touching the cart or placing an order once the run was aborted
+        """
+        if self.abort_event is not None and self.abort_event.is_set():
+            raise RunAborted("Run aborted: the worker lost its job or account lease")
+
+    def navigate(self, url: str, page_type: str, step: str):
+        """
+        Navigate to a URL, recording browser performance data when tracing is enabled
+
+        :param url: The URL to navigate to
+        :param page_type: The page type used to group the performance summary
+        :param step: The automation step that triggered the navigation
+        """
+        if self.tracer:
+            self.tracer.navigate(self.driver, url, page_type, step)
+        else:
+            self.driver.get(url)
+
+    def wait_until(self, step: str, default_timeout: float, condition, keep_default: bool = False):
+        """
+        Wait for a condition using the timeout learned for this step
+
+        :param step: The step name the latency is recorded under
+        :param default_timeout: The timeout to use until enough latency samples exist
+        :param condition: The expected condition to wait for
+        :param keep_default: Never wait less than the default, for waits after an action
+        that can't be repeated (placing the order)
+        :return: The value returned by the condition
+        """
+        timeout = self.policy.timeout(step, default_timeout)
+        if keep_default:
+            timeout = max(timeout, default_timeout)
+        start = time.perf_counter()
+        try:
+            result = WebDriverWait(self.driver, timeout).until(condition)
+        except TimeoutException:
+            self.policy.record(step, time.perf_counter() - start, success=False)
+            raise
+        self.policy.record(step, time.perf_counter() - start, success=True)
+        return result
+
+    def run_batch(self, step: str, default_timeout: float, batch: DomBatch):
+        """
+        Run a batch of DOM interactions in a single WebDriver call
+
+        :param step: The step name the latency is recorded under; a batch covers several
+        waits, so it must not share a name with a single wait_until step
+        :param default_timeout: The timeout for each wait until enough latency samples exist
+        :param batch: The batch to run
+        :return: The result of each operation in the batch
+        """
+        timeout = self.policy.timeout(step, default_timeout)
+        start = time.perf_counter()
+        try:
+            results = batch.execute(self.driver, timeout)
+        except TimeoutException:
+            self.policy.record(step, time.perf_counter() - start, success=False)
+            raise
+        self.policy.record(step, time.perf_counter() - start, success=True)
+        return results
+
     def login(self):
         """
         Login to the web application
         """
         try:
-            username_field = WebDriverWait(self.driver, 10).until(
+            username_field = self.wait_until("login.email", 10,
                 EC.presence_of_element_located((By.ID, "Email"))
             )
             password_field = self.driver.find_element(By.ID, "Password")
@@ -92,7 +209,7 @@ class WebAutomation:
             login_button.click()
             self.logger.info("[+] Login submitted.")
 
-            WebDriverWait(self.driver, 10).until(
+            self.wait_until("login.catalog", 10,
                 EC.presence_of_element_located((By.XPATH, '//*[@id="catalogMain"]')) # '//*[@id="catalogMain"]/section/article/a/h3' --> old XPATH 
             )
             self.logger.info("[+] Login successful.")
@@ -107,18 +224,26 @@ class WebAutomation:
         :param item: The item to add to the cart
         """
         try:
-            self.driver.get(item.url)
+            self.navigate(item.url, "product", "add_to_cart")
             time.sleep(3)
-            quantity_input = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "qty_DocMartPrompt2"))
-            )
-            quantity_input.clear()
-            quantity_input.send_keys(str(item.quantity))
+            if BATCH_DOM_COMMANDS:
+                self.run_batch("add_to_cart.batch_form", 10, DomBatch()
+                    .wait("#qty_DocMartPrompt2")
+                    .set_value("#qty_DocMartPrompt2", str(item.quantity))
+                    .wait("#Save", clickable=True)
+                    .click("#Save")
+                )
+            else:
+                quantity_input = self.wait_until("add_to_cart.quantity_input", 10,
+                    EC.presence_of_element_located((By.ID, "qty_DocMartPrompt2"))
+                )
+                quantity_input.clear()
+                quantity_input.send_keys(str(item.quantity))
 
-            add_to_cart_button = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.XPATH, '//*[@id="Save"]'))
-            )
-            add_to_cart_button.click()
+                add_to_cart_button = self.wait_until("add_to_cart.save_button", 10,
+                    EC.element_to_be_clickable((By.XPATH, '//*[@id="Save"]'))
+                )
+                add_to_cart_button.click()
             time.sleep(3)
             self.logger.info(f"[+] Added product to cart: {item.sku}, Quantity: {item.quantity}")
         except (NoSuchElementException, TimeoutException) as e:
@@ -132,11 +257,17 @@ class WebAutomation:
         :param order_group: The order group to process
         """
         try:
+            self.emit("group_started", size_group=order_group.size_group, items=len(order_group.items))
             for item in order_group.items:
                 self.logger.info(f"[+] Adding product to cart: {item.sku}, Quantity: {item.quantity}")
-                self.add_to_cart(item)
+                start = time.perf_counter()
+                self.policy.call("add_to_cart", self.add_to_cart, item, retry_on=RETRYABLE_EXCEPTIONS)
+                self.emit("item_added", size_group=order_group.size_group, sku=item.sku,
+                          quantity=item.quantity, latency_ms=round((time.perf_counter() - start) * 1000))
 
             self.logger.info(f"[+] Processed order group: {order_group.size_group}")
+            # Every line was added; the cart contents are not checked (see check_cart_items)
+            self.emit("cart_filled", size_group=order_group.size_group, items=len(order_group.items))
         except Exception as e:
             self.logger.error(f"Failed to process order group: {e}")
             raise
@@ -146,10 +277,18 @@ class WebAutomation:
         Download the PDF by executing JavaScript to print the page and rename it
         """
         try:
-            order_confirmation_number = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, '//*[@id="OrderMeta"]/div[1]/strong'))
+            order_confirmation_number = self.wait_until("order_confirmation.job_number", 10,
+                EC.presence_of_element_located((By.XPATH, '//*[@id="OrderMeta"]/div[1]/strong')),
+                keep_default=True
             )
             order_confirmation_number = order_confirmation_number.text
+            new_file_path = f"./job_confirmations/{self.purchase_order_number}-{order_confirmation_number}.pdf"
+
+            if self.renderer:
+                try:
+                    return self.capture_confirmation_snapshot(new_file_path), order_confirmation_number
+                except Exception as e:
+                    self.logger.warning(f"[-] Error capturing confirmation snapshot, printing PDF instead: {e}")
 
             pdf = self.driver.execute_cdp_cmd("Page.printToPDF", {
                 "printBackground": True,
@@ -160,7 +299,6 @@ class WebAutomation:
             pdf_data = base64.b64decode(pdf['data'])
 
             # Rename the downloaded file TODO: CHANGE THIS IMPLEMENTATION TO S3 BUCKET
-            new_file_path = f"./job_confirmations/{self.purchase_order_number}-{order_confirmation_number}.pdf"
             with open(new_file_path, 'wb') as f:
                 f.write(pdf_data)
 
@@ -173,6 +311,61 @@ class WebAutomation:
             self.logger.error(f"[-] Error downloading PDF: {e}")
             return None
 
+    def capture_confirmation_snapshot(self, pdf_file_path: str) -> str:
+        """
+        Save the confirmation page as an MHTML snapshot and queue it for PDF rendering
+
+        :param pdf_file_path: The path the rendered PDF will be written to
+        :return: The PDF path, which is filled in once rendering completes
+        """
+        snapshot = self.driver.execute_cdp_cmd("Page.captureSnapshot", {"format": "mhtml"})
+
+        if not os.path.exists("./job_confirmations/snapshots"):
+            os.makedirs("./job_confirmations/snapshots")
+        snapshot_path = f"./job_confirmations/snapshots/{os.path.splitext(os.path.basename(pdf_file_path))[0]}.mhtml"
+        with open(snapshot_path, 'w', encoding='utf-8') as f:
+            f.write(snapshot['data'])
+
+        self.renderer.submit(snapshot_path, pdf_file_path)
+        self.logger.info(f"[+] Confirmation snapshot saved to {snapshot_path}, PDF rendering deferred")
+        return pdf_file_path
+
+    def backfill_pdf(self, size_group: str, pdf_file_path: str, error: str = None):
+        """
+        Store a deferred PDF in the automation response once it is rendered
+
+        :param size_group: The size group the PDF belongs to
+        :param pdf_file_path: The rendered PDF path
+        :param error: The render error, or None if rendering succeeded
+        """
+        # Runs on the renderer's callback thread while the caller may be serializing the
+        # response, so build a new size group entry and swap it in with a single assignment
+        sizes = self.automation_response["sizes"]
+        entry = dict(sizes[size_group])
+        if error:
+            entry["errors"] = {**entry["errors"], "pdf_error": error}
+        else:
+            entry["pdf"] = pdf_file_path
+        sizes[size_group] = entry
+        try:
+            if not error:
+                self.emit("pdf_stored", size_group=size_group, pdf=pdf_file_path)
+            if self.on_pdf_stored:
+                self.on_pdf_stored(self.automation_response)
+        finally:
+            with self.sink_lock:
+                self.pending_pdfs -= 1
+                close_sink = self.run_done and self.pending_pdfs == 0
+            if close_sink:
+                self.stop_event_sink()
+
+    def stop_event_sink(self):
+        """
+        Write the remaining progress events of this purchase order and close the JSONL file
+        """
+        if self.event_sink:
+            self.event_sink.stop()
+
     def check_cart_items(self, order_group: OrderGroup):
         """
         Check if all items from the order group are in the cart
@@ -180,8 +373,8 @@ class WebAutomation:
         :param order_group: The order group to check the cart items for
         :return: The list of missing items
         """
-        self.driver.get("https://www.myorderdesk.com/Cart.asp")
-        WebDriverWait(self.driver, 20).until(
+        self.navigate("https://www.myorderdesk.com/Cart.asp", "cart", "check_cart_items")
+        self.wait_until("check_cart_items.cart", 20,
             EC.presence_of_element_located((By.ID, "cart"))
         )
         cart_items = self.driver.find_elements(By.CSS_SELECTOR, "#cart tbody tr")
@@ -199,6 +392,9 @@ class WebAutomation:
             elif cart_skus[item.sku] != item.quantity:
                 missing_or_incorrect_items.append(item)
 
+        # Only emitted once the cart verification loop in run() is enabled again
+        self.emit("cart_verified", size_group=order_group.size_group,
+                  missing_or_incorrect=[item.sku for item in missing_or_incorrect_items])
         return missing_or_incorrect_items
 
     def retry_add_to_cart(self, missing_items: List[OrderItem]):
@@ -223,13 +419,13 @@ class WebAutomation:
         """
         try:
             # Click on the date input to open the calendar
-            date_input = WebDriverWait(self.driver, 10).until(
+            date_input = self.wait_until("select_date.date_input", 10,
                 EC.element_to_be_clickable((By.ID, "DueDate"))
             )
             date_input.click()
 
             # Wait for the calendar to appear
-            WebDriverWait(self.driver, 10).until(
+            self.wait_until("select_date.calendar", 10,
                 EC.presence_of_element_located((By.CLASS_NAME, "datepicker-days"))
             )
 
@@ -263,25 +459,39 @@ class WebAutomation:
         """
         try:
             self.logger.info("[+] Checking cart")
-            self.driver.get("https://www.myorderdesk.com/Cart.asp")
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, "frmCart"))
-            )
+            self.navigate("https://www.myorderdesk.com/Cart.asp", "cart", "clear_cart")
+            if BATCH_DOM_COMMANDS:
+                _, cart_wrapper = self.run_batch("clear_cart.batch_cart_form", 10, DomBatch()
+                    .wait("#frmCart")
+                    .exists("#cart_wrapper")
+                )
+            else:
+                self.wait_until("clear_cart.cart_form", 10,
+                    EC.presence_of_element_located((By.ID, "frmCart"))
+                )
+                cart_wrapper = self.driver.find_elements(By.ID, "cart_wrapper")
 
-            cart_wrapper = self.driver.find_elements(By.ID, "cart_wrapper")
             if cart_wrapper:
                 self.logger.info("[+] Cart has items, clearing...")
-                clear_cart_button = self.driver.find_element(By.XPATH, '//*[@id="frmCart"]/div[1]/div[2]/a[1]')
-                clear_cart_button.click()
-
-                # Wait for the confirmation dialog
-                WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CLASS_NAME, "w3-modal"))
-                )
-
-                # Click the "OK" button to confirm deletion
-                ok_button = self.driver.find_element(By.CSS_SELECTOR, "button.dlgbtn-ok")
-                ok_button.click()
+                if BATCH_DOM_COMMANDS:
+                    # Click clear, wait for the confirmation dialog and confirm in one call
+                    self.run_batch("clear_cart.batch_confirm_dialog", 10, DomBatch()
+                        .click('//*[@id="frmCart"]/div[1]/div[2]/a[1]', by="xpath")
+                        .wait(".w3-modal")
+                        .click("button.dlgbtn-ok")
+                    )
+                else:
+                    clear_cart_button = self.driver.find_element(By.XPATH, '//*[@id="frmCart"]/div[1]/div[2]/a[1]')
+                    clear_cart_button.click()
+
+                    # Wait for the confirmation dialog
+                    self.wait_until("clear_cart.confirm_dialog", 10,
+                        EC.presence_of_element_located((By.CLASS_NAME, "w3-modal"))
+                    )
+
+                    # Click the "OK" button to confirm deletion
+                    ok_button = self.driver.find_element(By.CSS_SELECTOR, "button.dlgbtn-ok")
+                    ok_button.click()
 
                 self.logger.info("[+] Cart cleared successfully")
             else:
@@ -304,28 +514,43 @@ class WebAutomation:
         7. Wait for the order confirmation page
         """
         try:
-            self.driver.get(f"https://www.myorderdesk.com/Cart.asp")
+            self.navigate("https://www.myorderdesk.com/Cart.asp", "cart", "checkout")
             time.sleep(3)
 
-            checkout_button = WebDriverWait(self.driver, 10).until(
-                EC.element_to_be_clickable((By.ID, 'checkout'))
-            )
-            checkout_button.click()
-            time.sleep(3)
+            if BATCH_DOM_COMMANDS:
+                self.run_batch("checkout.batch_checkout_button", 10, DomBatch()
+                    .wait("#checkout", clickable=True)
+                    .click("#checkout")
+                )
+                time.sleep(3)
 
-            # Input Purchase Order Number
-            purchase_order_number = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.ID, 'paymentCustom5982_1'))
-            )
-            purchase_order_number.send_keys(self.purchase_order_number)
+                # Fill in the Purchase Order Number, PX Priority and "I acknowledge and agree" in one call
+                self.run_batch("checkout.batch_payment_fields", 10, DomBatch()
+                    .wait("#paymentCustom5982_1")
+                    .set_value("#paymentCustom5982_1", self.purchase_order_number)
+                    .select_text("#paymentCustom5982_2", "ASAP")
+                    .select_text("#paymentCustom5982_5", ACKNOWLEDGE_TEXT)
+                )
+            else:
+                checkout_button = self.wait_until("checkout.checkout_button", 10,
+                    EC.element_to_be_clickable((By.ID, 'checkout'))
+                )
+                checkout_button.click()
+                time.sleep(3)
+
+                # Input Purchase Order Number
+                purchase_order_number = self.wait_until("checkout.po_input", 10,
+                    EC.presence_of_element_located((By.ID, 'paymentCustom5982_1'))
+                )
+                purchase_order_number.send_keys(self.purchase_order_number)
 
-            # Select PX Priority (ASAP)
-            px_priority_select = Select(self.driver.find_element(By.ID, "paymentCustom5982_2"))
-            px_priority_select.select_by_visible_text("ASAP")
+                # Select PX Priority (ASAP)
+                px_priority_select = Select(self.driver.find_element(By.ID, "paymentCustom5982_2"))
+                px_priority_select.select_by_visible_text("ASAP")
 
-            # Select "I acknowledge and agree"
-            acknowledge_select = Select(self.driver.find_element(By.ID, "paymentCustom5982_5"))
-            acknowledge_select.select_by_visible_text("to the terms shown in the PX catalog welcome page and the policies linked at the bottom of the site.")
+                # Select "I acknowledge and agree"
+                acknowledge_select = Select(self.driver.find_element(By.ID, "paymentCustom5982_5"))
+                acknowledge_select.select_by_visible_text(ACKNOWLEDGE_TEXT)
 
             # Select requested by date
             self.select_next_available_date()
@@ -333,16 +558,18 @@ class WebAutomation:
             time.sleep(3)
 
             if not TEST_MODE:
+                self.check_abort()
                 # Click the Place Order button
-                place_order_button = WebDriverWait(self.driver, 10).until(
+                place_order_button = self.wait_until("checkout.place_order_button", 10,
                 EC.element_to_be_clickable((By.ID, 'checkout-2'))
                 )
                 place_order_button.click()
                 time.sleep(3)
 
                 # Wait for the order confirmation page
-                WebDriverWait(self.driver, 20).until(
-                    EC.presence_of_element_located((By.ID, "OrderMeta"))
+                self.wait_until("checkout.order_meta", 20,
+                    EC.presence_of_element_located((By.ID, "OrderMeta")),
+                    keep_default=True
                 )
 
                 pdf_file_path, order_confirmation_number = self.order_confirmation_page()
@@ -355,6 +582,39 @@ class WebAutomation:
             self.logger.error(f"[-] Error checking out: {e}")
             raise
 
+    def preflight(self, order_groups: List[OrderGroup]) -> List[OrderGroup]:
+        """
+        Validate every product URL over HTTP and drop the lines that can't be ordered
+
+        Rejected lines are recorded in the automation response errors; a group
+        with no lines left gets a group_error and is skipped.
+
+        :param order_groups: The order groups to validate
+        :return: The order groups with only the valid lines
+        """
+        urls = [item.url for order_group in order_groups for item in order_group.items]
+        url_errors = self.preflight_validator.validate(
+            urls, self.driver.get_cookies(), self.driver.execute_script("return navigator.userAgent")
+        )
+
+        valid_groups = []
+        for order_group in order_groups:
+            valid_items = []
+            for item in order_group.items:
+                error = url_errors.get(item.url)
+                if error:
+                    self.logger.warning(f"[-] Preflight rejected {item.sku}: {error}")
+                    self.automation_response["errors"][item.sku] = {'Error': error, 'Quantity': item.quantity}
+                else:
+                    valid_items.append(item)
+
+            if not valid_items:
+                self.automation_response["sizes"][order_group.size_group]["errors"]["group_error"] = "No valid items after preflight"
+            valid_groups.append(OrderGroup(size_group=order_group.size_group, items=valid_items))
+
+        self.logger.info(f"[+] Preflight rejected {len(url_errors)} product URLs")
+        return valid_groups
+
     def run(self, order_groups: List[OrderGroup]):
         """
         Run the web automation
@@ -362,14 +622,27 @@ class WebAutomation:
         :param order_groups: The list of order groups to process
         """
         try:
+            if PROGRESS_EVENTS_JSONL:
+                self.event_sink = JsonlSink(
+                    progress_bus,
+                    f"./logs/{self.purchase_order_number}-{datetime.now().strftime('%m-%d-%Y')}-events.jsonl",
+                    self.purchase_order_number
+                )
+            self.emit("run_started", size_groups=[order_group.size_group for order_group in order_groups])
             self.initialize_driver()
             self.login()
+            if self.preflight_validator:
+                order_groups = self.preflight(order_groups)
 
             for order_group in order_groups:
+                self.check_abort()
+                if not order_group.items:
+                    continue
                 try:
-                    self.clear_cart()
+                    self.policy.call("clear_cart", self.clear_cart, retry_on=RETRYABLE_EXCEPTIONS)
                     self.process_order_group(order_group)
 
+                    # Nothing verifies the cart until the loop below is enabled again, so stop before checkout
                     print(f"Problematic SKUs: {[sku for size in self.automation_response['sizes'].values() for sku, error in size.get('errors', {}).items() if sku != 'group_error']}")
                     raise SystemExit("End Test")
                     # retry_count = 0
@@ -387,12 +660,27 @@ class WebAutomation:
                     pdf_file_path, order_confirmation_number = self.checkout()
                     if order_confirmation_number and pdf_file_path:
                         self.automation_response["sizes"][order_group.size_group]["job_number"] = order_confirmation_number
-                        self.automation_response["sizes"][order_group.size_group]["pdf"] = pdf_file_path
+                        self.emit("checkout_done", size_group=order_group.size_group, job_number=order_confirmation_number)
+                        if self.on_group_ordered:
+                            try:
+                                self.on_group_ordered(self.automation_response)
+                            except Exception as e:
+                                self.logger.error(f"[-] Failed to store job number {order_confirmation_number}: {e}")
+                        # Deferred PDFs are backfilled once the renderer finishes, after run() has returned
+                        with self.sink_lock:
+                            self.pending_pdfs += 1
+                        if not (self.renderer and self.renderer.assign(
+                                pdf_file_path, functools.partial(self.backfill_pdf, order_group.size_group))):
+                            with self.sink_lock:
+                                self.pending_pdfs -= 1
+                            self.automation_response["sizes"][order_group.size_group]["pdf"] = pdf_file_path
+                            self.emit("pdf_stored", size_group=order_group.size_group, pdf=pdf_file_path)
                         # TODO: Implement S3 bucket storage for PDF      
 
                     #break
                 except Exception as e:
                     self.logger.error(f"Error processing order group {order_group.size_group}: {e}")
+                    self.emit("group_failed", size_group=order_group.size_group, error=str(e))
                     self.automation_response["sizes"][order_group.size_group]["errors"]["group_error"] = str(e)
                     continue
 
@@ -403,8 +691,23 @@ class WebAutomation:
             self.automation_response["status_code"] = 500
             self.automation_response["error"] = str(e)
         finally:
+            if self.tracer:
+                self.tracer.write_summary()
+            self.policy.save()
+            self.logger.info(f"[+] Step latencies: {self.policy.summary()}")
+            if self.command_counter:
+                self.command_counter.log_summary()
+            self.logger.info(f"[+] Retries used: {self.policy.retries_used}/{self.policy.retry_budget}")
             if self.driver:
                 self.driver.quit()
+            self.emit("run_finished", status_code=self.automation_response.get("status_code"),
+                      webdriver_commands=self.command_counter.total if self.command_counter else 0)
+            # With deferred PDFs outstanding, the last backfill closes the sink so pdf_stored still reaches the file
+            with self.sink_lock:
+                self.run_done = True
+                close_sink = self.pending_pdfs == 0
+            if close_sink:
+                self.stop_event_sink()
             return self.automation_response
 
 
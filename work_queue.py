@@ -0,0 +1,238 @@
+import json
+import logging
+import sqlite3
+import time
+from typing import List, Optional, Tuple
+
+
+class WorkQueue:
+    """
+    SQLite-backed durable queue of purchase orders with lease-based claiming
+
+    A worker claims a PO by taking a lease that expires after the visibility
+    timeout. Long runs must renew the lease; if a worker crashes its lease
+    expires and the PO becomes claimable again. Robot account usernames are
+    leased the same way so no two workers ever share a cart. Passwords are
+    never stored in the database.
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        self.logger = logging.getLogger(__name__)
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    purchase_order_number TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    lease_owner TEXT,
+                    lease_expires_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, lease_expires_at);
+                CREATE TABLE IF NOT EXISTS credentials (
+                    username TEXT PRIMARY KEY,
+                    lease_owner TEXT,
+                    lease_expires_at REAL
+                );
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None lets us issue BEGIN IMMEDIATE so claims are serialized across processes
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, json_payload: str) -> int:
+        """
+        Add a purchase order to the queue
+
+        :param json_payload: The JSON payload passed to scraper.main
+        :return: The job id
+        """
+        purchase_order_number = json.loads(json_payload)['purchase_order_number']
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (purchase_order_number, payload, created_at) VALUES (?, ?, ?)",
+                (purchase_order_number, json_payload, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim(self, worker_id: str, visibility_timeout: float) -> Optional[Tuple[int, str]]:
+        """
+        Claim the oldest pending job, or one whose lease has expired
+
+        :param worker_id: The id of the claiming worker
+        :param visibility_timeout: How long the lease lasts without renewal (seconds)
+        :return: The job id and JSON payload, or None if nothing is claimable
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            # Jobs whose worker died too many times are parked instead of retried forever
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', lease_owner = NULL, result = ? "
+                "WHERE status = 'leased' AND lease_expires_at < ? AND attempts >= ?",
+                (json.dumps({"critical_error": "Lease expired too many times"}), now, self.max_attempts)
+            )
+            row = conn.execute(
+                "SELECT id, payload FROM jobs "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires_at < ?) "
+                "ORDER BY id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires_at = ?, attempts = attempts + 1 "
+                "WHERE id = ?",
+                (worker_id, now + visibility_timeout, row[0])
+            )
+            conn.execute("COMMIT")
+            return row[0], row[1]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew(self, job_id: int, worker_id: str, visibility_timeout: float) -> bool:
+        """
+        Extend the lease on a job
+
+        :param job_id: The job id
+        :param worker_id: The id of the worker holding the lease
+        :param visibility_timeout: How long the lease lasts from now (seconds)
+        :return: False if the lease was lost to another worker
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + visibility_timeout, job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: dict, failed: bool = False) -> bool:
+        """
+        Store the automation response and release the job
+
+        :param job_id: The job id
+        :param worker_id: The id of the worker holding the lease
+        :param result: The automation response
+        :param failed: Whether the run failed
+        :return: False if the lease was lost to another worker
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, lease_owner = NULL, lease_expires_at = NULL "
+                "WHERE id = ? AND lease_owner = ?",
+                ('failed' if failed else 'done', json.dumps(result), job_id, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def update_result(self, job_id: int, result: dict) -> None:
+        """
+        Replace the stored automation response of a finished job (e.g. when a deferred PDF is backfilled)
+
+        :param job_id: The job id
+        :param result: The automation response
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET result = ? WHERE id = ? AND status IN ('done', 'failed')",
+                (json.dumps(result), job_id)
+            )
+
+    def add_credentials(self, usernames: List[str]) -> None:
+        """
+        Register robot account usernames in the credential pool
+
+        :param usernames: The usernames to register
+        """
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO credentials (username) VALUES (?)",
+                [(username,) for username in usernames]
+            )
+
+    def lease_credential(self, worker_id: str, visibility_timeout: float, usernames: List[str]) -> Optional[str]:
+        """
+        Lease a robot account that no other worker is using
+
+        :param worker_id: The id of the leasing worker
+        :param visibility_timeout: How long the lease lasts without renewal (seconds)
+        :param usernames: The accounts this worker has passwords for
+        :return: The leased username, or None if every account is in use
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            placeholders = ", ".join("?" for _ in usernames)
+            row = conn.execute(
+                f"SELECT username FROM credentials WHERE username IN ({placeholders}) "
+                "AND (lease_owner IS NULL OR lease_owner = ? OR lease_expires_at < ?) "
+                "ORDER BY lease_owner = ? DESC LIMIT 1",
+                (*usernames, worker_id, now, worker_id)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE credentials SET lease_owner = ?, lease_expires_at = ? WHERE username = ?",
+                (worker_id, now + visibility_timeout, row[0])
+            )
+            conn.execute("COMMIT")
+            return row[0]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def renew_credential(self, username: str, worker_id: str, visibility_timeout: float) -> bool:
+        """
+        Extend the lease on a robot account
+
+        :param username: The leased username
+        :param worker_id: The id of the worker holding the lease
+        :param visibility_timeout: How long the lease lasts from now (seconds)
+        :return: False if the lease was lost to another worker
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE credentials SET lease_expires_at = ? WHERE username = ? AND lease_owner = ?",
+                (time.time() + visibility_timeout, username, worker_id)
+            )
+            return cursor.rowcount == 1
+
+    def release_credential(self, username: str, worker_id: str) -> None:
+        """
+        Return a robot account to the pool
+
+        :param username: The leased username
+        :param worker_id: The id of the worker holding the lease
+        """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE credentials SET lease_owner = NULL, lease_expires_at = NULL "
+                "WHERE username = ? AND lease_owner = ?",
+                (username, worker_id)
+            )
+
+    def counts(self) -> dict:
+        """
+        Count jobs per status
+
+        :return: A dict of status to number of jobs
+        """
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
@@ -0,0 +1,195 @@
+"""
+This script runs several automation workers in parallel, each using its own
+robot account so no two workers share a myorderdesk cart.
+
+POs are stored in a local SQLite queue (see work_queue.py). Workers claim a
+PO and a robot account under leases that they renew while the automation
+runs; if a worker crashes, its leases expire and the PO is picked up again.
+
+Add the robot accounts to the .env file as comma separated username:password pairs:
+ROBOT_CREDENTIALS="robot1:password1,robot2:password2"
+
+Usage:
+- python3 worker.py enqueue orders/PO123.csv orders/PO124.csv
+- python3 worker.py run --workers 2
+- python3 worker.py status
+"""
+
+import argparse
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Dict
+
+from dotenv import load_dotenv
+
+from config import QUEUE_DB_PATH, LEASE_VISIBILITY_TIMEOUT, PROGRESS_SSE_PORT
+from work_queue import WorkQueue
+from confirmation_renderer import shutdown_renderer
+from progress import start_sse_server
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# How long an idle worker sleeps before polling the queue again
+POLL_INTERVAL = 5
+
+
+def load_credentials() -> Dict[str, str]:
+    """
+    Load the robot account pool from the environment
+
+    :return: A dict of username to password
+    """
+    credentials = {}
+    for pair in os.getenv("ROBOT_CREDENTIALS", "").split(","):
+        if ":" in pair:
+            username, password = pair.strip().split(":", 1)
+            credentials[username] = password
+
+    # Fall back to the single account used by scraper.py
+    if not credentials and os.getenv("USERNAME"):
+        credentials[os.getenv("USERNAME")] = os.getenv("PASSWORD")
+    return credentials
+
+
+def renew_leases(queue: WorkQueue, job_id: int, username: str, worker_id: str,
+                 stop: threading.Event, lease_lost: threading.Event) -> None:
+    """
+    Keep the job and credential leases alive until the run finishes
+
+    :param queue: The work queue
+    :param job_id: The claimed job id
+    :param username: The leased robot account
+    :param worker_id: The id of the worker holding the leases
+    :param stop: Set when the run has finished
+    :param lease_lost: Set when either lease was lost, which aborts the run
+    """
+    while not stop.wait(LEASE_VISIBILITY_TIMEOUT / 3):
+        try:
+            job_renewed = queue.renew(job_id, worker_id, LEASE_VISIBILITY_TIMEOUT)
+            account_renewed = queue.renew_credential(username, worker_id, LEASE_VISIBILITY_TIMEOUT)
+        except Exception as e:
+            logger.error(f"[-] Worker {worker_id} failed to renew its leases: {e}")
+            continue
+        if not job_renewed:
+            logger.error(f"[-] Worker {worker_id} lost the lease on job {job_id}, aborting the run")
+        if not account_renewed:
+            logger.error(f"[-] Worker {worker_id} lost the lease on account {username}, aborting the run")
+        if not (job_renewed and account_renewed):
+            lease_lost.set()
+            return
+
+
+def run_worker(worker_number: int, exit_when_empty: bool) -> None:
+    """
+    Claim and process POs until the queue is empty
+
+    :param worker_number: The number of this worker on the host
+    :param exit_when_empty: Stop once there is nothing left to claim
+    """
+    # Imported here so each process sets up its own selenium/logging state
+    from scraper import main
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{worker_number}"
+    if PROGRESS_SSE_PORT:
+        # Each process has its own progress bus, so each worker serves its own port
+        start_sse_server(PROGRESS_SSE_PORT + worker_number)
+    queue = WorkQueue(QUEUE_DB_PATH)
+    credentials = load_credentials()
+
+    while True:
+        username = queue.lease_credential(worker_id, LEASE_VISIBILITY_TIMEOUT, list(credentials))
+        if username is None:
+            # Every account is busy; wait for another worker to release one
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        claimed = queue.claim(worker_id, LEASE_VISIBILITY_TIMEOUT)
+        if claimed is None:
+            queue.release_credential(username, worker_id)
+            if exit_when_empty:
+                logger.info(f"[+] Worker {worker_id} found no work, exiting")
+                # Let deferred confirmation PDFs finish so their results are stored
+                shutdown_renderer()
+                return
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        job_id, json_payload = claimed
+        logger.info(f"[+] Worker {worker_id} claimed job {job_id} with account {username}")
+
+        stop = threading.Event()
+        lease_lost = threading.Event()
+        renewer = threading.Thread(
+            target=renew_leases, args=(queue, job_id, username, worker_id, stop, lease_lost), daemon=True
+        )
+        renewer.start()
+        try:
+            automation_response = main(
+                json_payload, username, credentials[username], abort_event=lease_lost,
+                on_pdf_stored=lambda response, job_id=job_id: queue.update_result(job_id, response)
+            )
+            failed = automation_response.get("status_code") != 200
+        except Exception as e:
+            logger.error(f"[-] Worker {worker_id} failed job {job_id}: {e}")
+            automation_response = {"status_code": 500, "critical_error": str(e)}
+            failed = True
+        finally:
+            stop.set()
+            renewer.join()
+
+        if not queue.complete(job_id, worker_id, automation_response, failed=failed):
+            logger.warning(f"[-] Job {job_id} was reclaimed by another worker before {worker_id} finished")
+        queue.release_credential(username, worker_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MoellerMatic multi-worker queue")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add PO CSV files to the queue")
+    enqueue_parser.add_argument("csv_paths", nargs="+")
+
+    run_parser = subparsers.add_parser("run", help="Start worker processes")
+    run_parser.add_argument("--workers", type=int, default=None,
+                            help="Number of worker processes (defaults to the number of robot accounts)")
+    run_parser.add_argument("--forever", action="store_true", help="Keep polling when the queue is empty")
+
+    subparsers.add_parser("status", help="Show job counts per status")
+    args = parser.parse_args()
+
+    queue = WorkQueue(QUEUE_DB_PATH)
+    if args.command == "enqueue":
+        from scraper import csv_to_json_payload
+        for csv_path in args.csv_paths:
+            json_payload = csv_to_json_payload(csv_path)
+            if json_payload:
+                print(f"Queued {csv_path} as job {queue.enqueue(json_payload)}")
+            else:
+                print(f"Failed to read {csv_path}")
+    elif args.command == "run":
+        credentials = load_credentials()
+        if not credentials:
+            raise SystemExit("No robot accounts configured, set ROBOT_CREDENTIALS in the .env file")
+        queue.add_credentials(list(credentials))
+
+        worker_count = args.workers or len(credentials)
+        processes = [
+            multiprocessing.Process(target=run_worker, args=(number, not args.forever))
+            for number in range(worker_count)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        print(queue.counts())
+    else:
+        print(queue.counts())
+
+
+if __name__ == "__main__":
+    main()